@@ -1,28 +1,163 @@
 #!/usr/bin/python3
+from __future__ import annotations
+
 import json
 import logging
-import smtplib
+import mmap
+import os
+import socket
+import socketserver
 import sys
+import threading
 import time
-from email.message import EmailMessage
-from email.utils import formatdate
+from contextlib import ExitStack, contextmanager
+from functools import cache, partial
 from pathlib import Path
-from typing import List
+from typing import TYPE_CHECKING, BinaryIO, Callable, Dict, Iterator, List
+
+if TYPE_CHECKING:  # smtplib, ssl, email and concurrent.futures are imported when first needed
+    import smtplib
+    import ssl
+    from concurrent.futures import Future
+    from email.contentmanager import ContentManager
+    from email.message import EmailMessage
+
+try:  # Optional - if available, wait on inotify events rather than polling
+    from inotify_simple import INotify, flags as inotify_flags
+except ImportError:
+    INotify = None
+
+try:  # Optional - if available, use SIMD accelerated base64 for attachments
+    from pybase64 import b64encode
+except ImportError:
+    from base64 import b64encode
 
 log = logging.getLogger('onvifemail')
 
+JPEG_WAIT_SECONDS = 10.0
+
+JPEG_POLL_MIN_SECONDS = 0.01
+
+JPEG_POLL_MAX_SECONDS = 1.0
+
+RELAY_SOCKET_PATH = Path(os.environ.get('XDG_RUNTIME_DIR', Path.home() / '.cache')) / 'onvifeye-mail.sock'
+
+RELAY_IDLE_SECONDS = 100
+
+RELAY_SEND_SECONDS = 60.0  # Allowed for the relay to wait for the jpegs and send, after any coalescing window
+
+SMTP_IMPLICIT_TLS_PORT = 465
+
+SMTP_TIMEOUT_SECONDS = 30.0
+
+EMAIL_CONFIG_FILE = Path.home() / '.config' / 'onvifeye' / 'onvifeye-email.conf'
+
+
+def open_jpeg(filename: Path) -> BinaryIO | None:
+    try:
+        return open(filename, 'rb')
+    except FileNotFoundError:
+        return None
+
+
+# Returns the jpeg opened for reading, or None if it didn't appear within the timeout.
+def open_when_written(filename: Path, timeout_seconds: float = JPEG_WAIT_SECONDS) -> BinaryIO | None:
+    if jpeg_file := open_jpeg(filename):
+        return jpeg_file
+    deadline = time.monotonic() + timeout_seconds
+    if INotify is None or not filename.parent.is_dir():  # Fall back to polling, backing off from 10ms to 1s
+        delay_seconds = JPEG_POLL_MIN_SECONDS
+        while (remaining := deadline - time.monotonic()) > 0:
+            time.sleep(min(delay_seconds, remaining))
+            if jpeg_file := open_jpeg(filename):
+                return jpeg_file
+            delay_seconds = min(delay_seconds * 2, JPEG_POLL_MAX_SECONDS)
+        return None
+    with INotify() as inotify:
+        inotify.add_watch(filename.parent, inotify_flags.CLOSE_WRITE | inotify_flags.MOVED_TO)
+        if jpeg_file := open_jpeg(filename):  # Might have been written before the watch was in place
+            return jpeg_file
+        while (remaining := deadline - time.monotonic()) > 0:
+            for event in inotify.read(timeout=int(remaining * 1000)):
+                if event.name == filename.name and (jpeg_file := open_jpeg(filename)):
+                    return jpeg_file
+    return open_jpeg(filename)
+
+
+def encode_base64_lines(data, max_line_length: int) -> str:
+    # Encode the whole attachment in one call, then split it into lines, rather than
+    # encoding line by line as email.contentmanager does.
+    line_length = max_line_length // 4 * 4
+    encoded = b64encode(data).decode('ascii')
+    return ''.join(encoded[i:i + line_length] + '\n' for i in range(0, len(encoded), line_length))
+
+
+# A copy of the email package's raw_data_manager that encodes binary content with encode_base64_lines(),
+# so the email package itself is left unchanged.
+@cache
+def attachment_content_manager() -> ContentManager:
+    from email.contentmanager import ContentManager, raw_data_manager, set_bytes_content
+
+    def set_base64_bytes_content(msg, data, maintype, subtype, cte='base64', **kwargs):
+        if cte != 'base64':
+            return set_bytes_content(msg, data, maintype, subtype, cte, **kwargs)
+        encoded = encode_base64_lines(data, msg.policy.max_line_length)
+        set_bytes_content(msg, encoded.encode('ascii'), maintype, subtype, '7bit', **kwargs)
+        msg.replace_header('Content-Transfer-Encoding', 'base64')
+
+    content_manager = ContentManager()
+    content_manager.get_handlers.update(raw_data_manager.get_handlers)
+    content_manager.set_handlers.update(raw_data_manager.set_handlers)
+    for data_type in (bytes, bytearray, memoryview):
+        content_manager.add_set_handler(data_type, set_base64_bytes_content)
+    return content_manager
+
+
+@contextmanager
+def map_file(fd) -> Iterator[memoryview]:
+    # Let the kernel page the file in on demand rather than reading a copy into memory.
+    if os.fstat(fd.fileno()).st_size == 0:  # An empty file can't be mapped
+        yield memoryview(b'')
+        return
+    with mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ) as mapped, memoryview(mapped) as view:
+        yield view
+
+
 def send_mail(send_from: str, send_to: List[str],
-              subject: str, message: str, jpeg_filenames: List[Path],
-              server="localhost", port=587, username='', password='', add_legal_stuff=False):
+              subject: str, message: str, jpeg_files: List[BinaryIO],
+              server="localhost", port=587, username='', password='', verify_tls=False, add_legal_stuff=False,
+              smtp_connection: Future[smtplib.SMTP] | None = None, relay: SmtpRelay | None = None):
+    # The message is composed once the server's extensions are known, see deliver().
+    compose = partial(compose_message, send_from, send_to, subject, message, jpeg_files, add_legal_stuff)
+    if relay is not None:
+        with relay.open_smtp() as relay_connection:
+            deliver(relay_connection, compose, send_from, send_to, jpeg_files)
+        return
+    if smtp_connection is not None:  # Already connecting in the background
+        smtp_connection = smtp_connection.result()
+    else:
+        smtp_connection = smtp_connect(server, port, username, password, verify_tls)
+    deliver(smtp_connection, compose, send_from, send_to, jpeg_files)
+    smtp_connection.close()
+
+
+# If binary_placeholder is given, it stands in for each jpeg's content, which is sent separately in its place.
+def compose_message(send_from: str, send_to: List[str], subject: str, message: str, jpeg_files: List[BinaryIO],
+                    add_legal_stuff: bool, binary_placeholder: bytes | None = None) -> EmailMessage:
+    from email.message import EmailMessage
+    from email.utils import formatdate, make_msgid, parseaddr
+
     msg = EmailMessage()
     msg['From'] = send_from
     msg['To'] = ", ".join(send_to)
     msg['Subject'] = subject
     msg['Date'] = formatdate(localtime=True)
+    # Passing a domain stops make_msgid() looking up the fully qualified host name in DNS.
+    _, at, domain = parseaddr(send_from)[1].rpartition('@')
+    msg['Message-ID'] = make_msgid(domain=domain if at else socket.gethostname())
 
-    attachment_cid = {}
     img_text = ''
-    for i, jpeg_filename in enumerate(jpeg_filenames):
+    for i, _ in enumerate(jpeg_files):
         img_text += f'<img src="cid:image{i}"/>'
 
     boilerplate = """
@@ -40,65 +175,313 @@ def send_mail(send_from: str, send_to: List[str],
                         f'<br/><br/>{boilerplate}</body></html>',
                         'html')
 
-    for i, jpeg_filename in enumerate(jpeg_filenames):
-        with open(jpeg_filename, "rb") as fd:
-            msg.get_payload()[1].add_related(fd.read(), 'image', 'jpeg',
-                                             cid=f'<image{i}>',
-                                             filename=jpeg_filename.name)
-                                             #disposition='inline')  # Might be needed for some clients?
+    related = msg.get_payload()[1]
+    for i, jpeg_file in enumerate(jpeg_files):
+        if binary_placeholder is not None:
+            related.add_related(binary_placeholder, 'image', 'jpeg', cte='binary',
+                                cid=f'<image{i}>',
+                                filename=Path(jpeg_file.name).name)
+            continue
+        with map_file(jpeg_file) as jpeg_data:
+            related.add_related(jpeg_data, 'image', 'jpeg',
+                                content_manager=attachment_content_manager(),
+                                cid=f'<image{i}>',
+                                filename=Path(jpeg_file.name).name)
+                                #disposition='inline')  # Might be needed for some clients?
+    return msg
+
+
+# All recipients are given in one transaction (one MAIL FROM, an RCPT TO for each recipient),
+# so the message is only transferred once however many recipients there are.
+# The server's extensions are checked before composing, so jpegs that will be sent
+# as binary MIME are never base64 encoded.
+def deliver(smtp_connection: smtplib.SMTP, compose: Callable[..., EmailMessage], send_from: str, send_to: List[str],
+            jpeg_files: List[BinaryIO]):
+    smtp_connection.ehlo_or_helo_if_needed()
+    if jpeg_files and smtp_connection.has_extn('chunking') and smtp_connection.has_extn('binarymime'):
+        placeholder = f'onvifeye-jpeg-{time.time_ns()}'.encode('ascii')
+        send_binary_mime(smtp_connection, compose(binary_placeholder=placeholder), placeholder,
+                         send_from, send_to, jpeg_files)
+    else:
+        smtp_connection.send_message(compose(), from_addr=send_from, to_addrs=send_to)
+
+
+# Send the jpegs unencoded using BDAT (RFC 3030) to avoid base64's CPU cost and 33% size overhead.
+# The email package can't generate binary parts (it rewrites their line endings), so the jpeg
+# parts are generated with placeholders, and the raw jpegs are sent in their place.
+def send_binary_mime(smtp_connection: smtplib.SMTP, msg: EmailMessage, placeholder: bytes,
+                     send_from: str, send_to: List[str], jpeg_files: List[BinaryIO]):
+    import smtplib
+    text_chunks = msg.as_bytes(policy=msg.policy.clone(linesep='\r\n')).split(placeholder)
+    code, response = smtp_connection.mail(send_from, ['BODY=BINARYMIME'])
+    if code != 250:
+        raise smtplib.SMTPSenderRefused(code, response, send_from)
+    refused = {}
+    for recipient in send_to:
+        code, response = smtp_connection.rcpt(recipient)
+        if code not in (250, 251):
+            refused[recipient] = (code, response)
+    if len(refused) == len(send_to):
+        smtp_connection.rset()
+        raise smtplib.SMTPRecipientsRefused(refused)
+    for text_chunk, jpeg_file in zip(text_chunks, jpeg_files):
+        send_bdat_chunk(smtp_connection, text_chunk)
+        send_bdat_file_chunk(smtp_connection, jpeg_file)
+    send_bdat_chunk(smtp_connection, text_chunks[-1], last=True)
+
+
+def send_bdat_chunk(smtp_connection: smtplib.SMTP, data: bytes, last: bool = False):
+    if not data and not last:
+        return
+    smtp_connection.send(f'BDAT {len(data)}{" LAST" if last else ""}\r\n')
+    smtp_connection.send(data)
+    check_bdat_reply(smtp_connection)
+
+
+def send_bdat_file_chunk(smtp_connection: smtplib.SMTP, file: BinaryIO):
+    if not (size := os.fstat(file.fileno()).st_size):
+        return
+    smtp_connection.send(f'BDAT {size}\r\n')
+    # Zero-copy os.sendfile() on a plain socket, socket.sendfile() falls back to send() over TLS.
+    smtp_connection.sock.sendfile(file, offset=0, count=size)
+    check_bdat_reply(smtp_connection)
+
+
+def check_bdat_reply(smtp_connection: smtplib.SMTP):
+    import smtplib
+    code, response = smtp_connection.getreply()
+    if code != 250:
+        smtp_connection.rset()
+        raise smtplib.SMTPDataError(code, response)
+
 
-    smtp_connection = smtplib.SMTP(host=server, port=port)
-    smtp_connection.starttls()
+# Port 465 is implicit TLS (one handshake), otherwise upgrade the connection with STARTTLS.
+# The server's certificate is only verified if verify_tls is set, local relays often have self-signed ones.
+def smtp_connect(server="localhost", port=587, username='', password='', verify_tls=False, **_) -> smtplib.SMTP:
+    import smtplib
+    context = verified_ssl_context() if verify_tls else None
+    if int(port) == SMTP_IMPLICIT_TLS_PORT:
+        smtp_connection = smtplib.SMTP_SSL(host=server, port=port, timeout=SMTP_TIMEOUT_SECONDS, context=context)
+    else:
+        smtp_connection = smtplib.SMTP(host=server, port=port, timeout=SMTP_TIMEOUT_SECONDS)
+        smtp_connection.starttls(context=context)
     smtp_connection.login(username, password)
-    smtp_connection.sendmail(send_from, send_to, msg.as_string())
-    smtp_connection.close()
+    return smtp_connection
 
-# The sys.argv arguments expected to be: camera-id detectionType/yyyymmdd-hhmmss
-# For example: python3 onvifeye-email.py c125-1 IsPerson/20250928-125933
-# The detection type and date-time is used in the email subject.  T
-# The jpeg is attached to the email.
-# The jpeg is expected to found in $HOME/onvifeye/images/camera-id/yyyymmdd-hhmmss.jpg
-# In this example, the jpeg should be in $HOME/onvifeye/images/c125-1/20250928-125933.jpg
-# The script will loop testing for jpeg to be written for 10 seconds and then give
-# up waiting and email anyway.
-def main():
-    config_file = Path.home() / '.config' / 'onvifeye' / 'onvifeye-email.conf'
-    log.info(f'Reading email config from {config_file.as_posix()}.')
-    email_config = None
-    with open(config_file) as fp:
-        email_config = json.load(fp, strict=False)
-        log.info(email_config)
-    if email_config:
-        camera_id = sys.argv[1]
-        detections = { k: v for k, v in [a.split('/') for a in sys.argv[2:]] }
-        subject = f'Camera {camera_id} detected ' + ','.join(
-            [ f'{k.removeprefix("Is").lower()} at {v}' for k, v in detections.items()])
-        message = (f'Camera: {camera_id}\n\n' +
-                   '\n'.join([ f'{k.removeprefix("Is")} detected at {v}'
-                              for k, v in detections.items()]))
-        attachments = []
-        for _, when_str in detections.items():
-            #when_str = list(detections.values())[0]
+
+# Created once, so a relay doesn't reload the CA certificates for every connection.
+@cache
+def verified_ssl_context() -> ssl.SSLContext:
+    import ssl
+    return ssl.create_default_context()
+
+
+# Pass the event's arguments to a running relay (onvifeye-email.py --relay) which
+# processes them in its already running interpreter using its already authenticated
+# SMTP connection.  Returns False if no relay is available, the relay failed, or the
+# relay didn't reply within timeout seconds.
+def relay_submit(event_args: List[str], timeout: float) -> bool:
+    if not RELAY_SOCKET_PATH.exists():
+        return False
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as relay_socket:
+            relay_socket.settimeout(timeout)  # A hung relay mustn't stop the event being emailed
+            relay_socket.connect(RELAY_SOCKET_PATH.as_posix())
+            relay_socket.sendall(json.dumps(event_args).encode('utf-8') + b'\n')
+            relay_socket.shutdown(socket.SHUT_WR)
+            reply = relay_socket.makefile('rb').readline().decode('utf-8').strip()
+    except TimeoutError:
+        log.warning(f'Relay {RELAY_SOCKET_PATH.as_posix()} did not reply within {timeout} seconds, sending directly')
+        return False
+    except OSError as relay_exception:
+        log.warning(f'Relay {RELAY_SOCKET_PATH.as_posix()} unavailable, sending directly [{repr(relay_exception)}]')
+        return False
+    if reply != 'OK':
+        log.warning(f'Relay failed to send, sending directly [{reply}]')
+        return False
+    return True
+
+
+class RelayRequestHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        try:
+            event_args = json.loads(self.rfile.readline())
+            self.server.process(event_args)
+            self.wfile.write(b'OK\n')
+        except Exception as relay_exception:
+            log.error(f'Relay: failed to send [{repr(relay_exception)}]')
+            self.server.close_smtp()
+            self.wfile.write(f'ERROR {repr(relay_exception)}\n'.encode('utf-8'))
+
+
+# A camera's events that arrived at the relay during one coalescing period, and the outcome of sending them.
+class EventBatch:
+    __slots__ = ('event_args', 'done', 'exception')
+
+    def __init__(self, event_args: List[str]):
+        self.event_args = list(event_args)
+        self.done = threading.Event()
+        self.exception: Exception | None = None
+
+
+# Processes events on behalf of short-lived invocations of this script, saving them the
+# cost of starting up.  Holds a single authenticated SMTP connection open for reuse by
+# successive emails, the connection is closed after RELAY_IDLE_SECONDS of inactivity.
+# If the email config sets relay_coalesce_seconds, events from a camera arriving within
+# that many seconds of its first event are sent as one email.
+class SmtpRelay(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+
+    timeout = RELAY_IDLE_SECONDS
+    daemon_threads = True
+
+    def __init__(self, email_config: dict, coalesce_seconds: float = 0):
+        self.email_config = email_config
+        self.smtp_connection: smtplib.SMTP | None = None
+        self.smtp_lock = threading.RLock()  # Events are processed in parallel, but share the connection
+        self.coalesce_seconds = coalesce_seconds
+        self.pending_batches: Dict[str, EventBatch] = {}
+        self.pending_lock = threading.Lock()
+        RELAY_SOCKET_PATH.unlink(missing_ok=True)
+        previous_umask = os.umask(0o177)  # Only this user may submit events
+        try:
+            super().__init__(RELAY_SOCKET_PATH.as_posix(), RelayRequestHandler)
+        finally:
+            os.umask(previous_umask)
+
+    # An event merged into an earlier event's batch waits for the batch to be sent and shares its
+    # outcome, so if sending fails, every invocation in the batch falls back to sending directly.
+    def process(self, event_args: List[str]):
+        if self.coalesce_seconds <= 0:
+            process_event(self.email_config, event_args, relay=self)
+            return
+        camera_id = event_args[0]
+        with self.pending_lock:
+            if (batch := self.pending_batches.get(camera_id)) is None:
+                self.pending_batches[camera_id] = batch = EventBatch(event_args)
+                first_event = True
+            else:
+                batch.event_args.extend(event_args[1:])
+                first_event = False
+        if not first_event:
+            batch.done.wait()
+            if batch.exception is not None:
+                raise batch.exception
+            return
+        time.sleep(self.coalesce_seconds)
+        with self.pending_lock:
+            del self.pending_batches[camera_id]
+        try:
+            process_event(self.email_config, batch.event_args, relay=self)
+        except Exception as send_exception:
+            batch.exception = send_exception
+            raise
+        finally:
+            batch.done.set()
+
+    # Holds the shared connection, reconnecting if it has been lost, while the caller sends a message.
+    @contextmanager
+    def open_smtp(self) -> Iterator[smtplib.SMTP]:
+        with self.smtp_lock:
+            if self.smtp_connection is not None:
+                try:
+                    self.smtp_connection.noop()  # Check the connection is still alive before reuse
+                except OSError:  # smtplib.SMTPException is an OSError
+                    log.info('Relay: SMTP connection lost, reconnecting')
+                    self.close_smtp()
+            if self.smtp_connection is None:
+                self.smtp_connection = smtp_connect(**self.email_config)
+            yield self.smtp_connection
+
+    def close_smtp(self):
+        with self.smtp_lock:
+            if self.smtp_connection is not None:
+                try:
+                    self.smtp_connection.quit()
+                except OSError:  # smtplib.SMTPException is an OSError
+                    self.smtp_connection.close()
+                self.smtp_connection = None
+
+    def handle_timeout(self):
+        self.close_smtp()
+
+    def serve(self):
+        log.info(f'Relay: listening on {RELAY_SOCKET_PATH.as_posix()}')
+        try:
+            while True:
+                self.handle_request()
+        finally:
+            self.close_smtp()
+            self.server_close()
+            RELAY_SOCKET_PATH.unlink(missing_ok=True)
+
+
+def load_email_config() -> dict:
+    log.info(f'Reading email config from {EMAIL_CONFIG_FILE.as_posix()}.')
+    with open(EMAIL_CONFIG_FILE) as fp:
+        return json.load(fp, strict=False)
+
+
+def process_event(email_config: dict, event_args: List[str], relay: SmtpRelay | None = None):
+    camera_id = event_args[0]
+    # A list rather than a dict, a relay's coalesced batch may hold several events of the same type.
+    detections = list(dict.fromkeys(tuple(a.split('/')) for a in event_args[1:]))
+    described = [(k.removeprefix("Is"), v) for k, v in detections]
+    subject = f'Camera {camera_id} detected ' + ','.join(f'{k.lower()} at {v}' for k, v in described)
+    message = f'Camera: {camera_id}\n\n' + '\n'.join(f'{k} detected at {v}' for k, v in described)
+    attachments = []
+    with ExitStack() as open_files:
+        smtp_connection = None
+        if relay is None:  # A relay has its own connection
+            from concurrent.futures import ThreadPoolExecutor
+            executor = open_files.enter_context(ThreadPoolExecutor(max_workers=1))
+            # Connect and login to the SMTP server while waiting for the jpegs to be written.
+            smtp_connection = executor.submit(smtp_connect, **email_config)
+        for _, when_str in detections:
             jpeg_path = Path.home() / 'onvifeye' / 'images' / camera_id
             jpeg_filename = jpeg_path / f'{when_str}.jpg'
-            if jpeg_filename in attachments:
+            if jpeg_filename.as_posix() in [attachment.name for attachment in attachments]:
                 continue  # Already done
             log.info(f"looking for {jpeg_filename.as_posix()}")
-            # print(f"looking for {jpeg_filename.as_posix()}")
-            for _ in range(10):  # give up after 10 seconds
-                if jpeg_filename.exists():
-                    break
-                time.sleep(1)
-            if not jpeg_filename.exists():  # May be multiple events, look for something close
+            if not (jpeg_file := open_when_written(jpeg_filename)):  # May be multiple events, look for something close
                 for jpeg_filename in sorted(jpeg_path.glob(f"{when_str[:-2]}*.jpg"), reverse=True):
                     log.info(f"found close match {jpeg_filename.as_posix()}")
                     message += f"\nFound close match {jpeg_filename.as_posix()}"
-            if jpeg_filename.exists():
-                attachments.append(jpeg_filename)
+                jpeg_file = open_jpeg(jpeg_filename)
+            if jpeg_file:
+                attachments.append(open_files.enter_context(jpeg_file))
             else:
                 message += f"\nCould not find {jpeg_filename}"
-        #print(attach_filename)
-        send_mail(**email_config, subject=subject, message=message, jpeg_filenames=attachments)
+        send_mail(**email_config, subject=subject, message=message, jpeg_files=attachments,
+                  smtp_connection=smtp_connection, relay=relay)
+
+
+# The sys.argv arguments expected to be: camera-id detectionType/yyyymmdd-hhmmss
+# For example: python3 onvifeye-email.py c125-1 IsPerson/20250928-125933
+# The detection type and date-time is used in the email subject.  T
+# The jpeg is attached to the email.
+# The jpeg is expected to found in $HOME/onvifeye/images/camera-id/yyyymmdd-hhmmss.jpg
+# In this example, the jpeg should be in $HOME/onvifeye/images/c125-1/20250928-125933.jpg
+# The script will wait for the jpeg to be written for 10 seconds and then give
+# up waiting and email anyway.  If inotify_simple is installed, the wait is woken
+# as soon as the jpeg is closed, otherwise the script polls at increasing intervals
+# (10 ms doubling up to 1 second).
+# Alternatively, run with the single argument --relay to start a long-running
+# relay.  While the relay is running, invocations of the script pass their
+# arguments to the relay, which processes the event and sends the email using
+# an SMTP connection that it keeps open between events.
+def main():
+    email_config = load_email_config()
+    # Only the relay uses this, the rest of the config is passed to send_mail() and smtp_connect().
+    coalesce_seconds = float(email_config.pop('relay_coalesce_seconds', 0))
+    if sys.argv[1:] != ['--relay'] and relay_submit(sys.argv[1:], timeout=coalesce_seconds + RELAY_SEND_SECONDS):
+        return
+    if email_config and sys.argv[1:] == ['--relay']:
+        with SmtpRelay(email_config, coalesce_seconds) as relay:
+            relay.serve()
+    elif email_config:
+        process_event(email_config, sys.argv[1:])
+
 
 if __name__ == '__main__':
     main()
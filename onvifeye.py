@@ -40,6 +40,8 @@ Prerequisites
 * ffmpeg-python (pip install ffmpeg-python). Take care not to confuse
   ffmpeg-python with python-ffmpeg the two are different ffmpeg python
   implementations.
+* uvloop (pip install uvloop) optional, used in place of the standard
+  asyncio event loop if installed.
 
 onvifeye Copyright (C) 2025 Michael Hamilton
 =============================================
@@ -63,33 +65,38 @@ with this program. If not, see <https://www.gnu.org/licenses/>.
 from __future__ import annotations
 
 import argparse
-import glob
+import ctypes
+import gc
 import json
 import logging
 import os
 import signal
-import subprocess
 import sys
 import termios
 import time
 import traceback
 from abc import ABC, abstractmethod
-from concurrent.futures import ProcessPoolExecutor
+from collections import deque
 from datetime import datetime, timedelta
 from functools import partial
+from operator import itemgetter
 from pathlib import Path
 from subprocess import Popen
-from typing import Dict, Callable
+from typing import Awaitable, Callable, Deque, Dict, List, Tuple
 
 MAX_FAIL_TO_POST_ERRORS = 5
 
-WAIT_NO_NOTIFICATIONS_SECONDS = 0.1
-
 WAIT_NO_NOTIFICATIONS_EXCEPTION_SECONDS = 5.0
 
+DETECTION_EXPIRY_CHECK_SECONDS = 1.0
+
 DEFAULT_DETECTION_EXPIRY_SECONDS = 60.0
 
-WAIT_FOR_LOCAL_VIDEO_SECONDS = 5.0
+WAIT_FOR_LOCAL_VIDEO_SECONDS = 15.0
+
+LOCAL_VIDEO_POLL_SECONDS = 1.0
+
+MEMORY_TRIM_INTERVAL_SECONDS = 600.0
 
 EVENT_NOT_HAPPENING_SUFFIX = '_False'
 
@@ -97,6 +104,18 @@ VIDEO_ENDED_SYNTHETIC_EVENT = 'VideoEnded'
 
 WILDCARD_EVENT = '*'
 
+# Decoders to pair with hardware encoders so frames stay on the device, for camera_video_encoder.
+VIDEO_ENCODER_HWACCEL = {
+    'h264_nvenc': 'cuda',
+    'h264_qsv': 'qsv',
+    'h264_vaapi': 'vaapi',
+    'h264_videotoolbox': 'videotoolbox',
+}
+
+# Start reading the camera stream without demuxer buffering, so clips and stills begin closer to the event.
+# The probe size is left at its default, stream copy needs the codec parameters that probing finds.
+RTSP_INPUT_ARGS = {'rtsp_transport': 'tcp', 'fflags': 'nobuffer', 'flags': 'low_delay'}
+
 try_ws_discovery = False
 if try_ws_discovery:
     from wsdiscovery import Scope, QName
@@ -111,6 +130,16 @@ from onvif.managers import PullPointManager
 import asyncio
 import aiohttp
 
+try:  # Optional - if available, use the faster libuv based event loop
+    import uvloop
+except ImportError:
+    uvloop = None
+
+try:  # Optional - glibc can hand freed heap back to the OS, keeps the RSS of a long running process down
+    malloc_trim = ctypes.CDLL('libc.so.6').malloc_trim if sys.platform.startswith('linux') else None
+except (OSError, AttributeError):
+    malloc_trim = None
+
 log = logging.getLogger('onvifeye')
 #logging.getLogger('onvif').setLevel(logging.DEBUG)
 
@@ -144,7 +173,8 @@ class CameraConfig(object):
                  camera_event_exec = '',
                  camera_event_exec_delay_seconds=0,
                  camera_save_folder = DATA_DIR.as_posix(),
-                 camera_grab_stills_from_video = True):
+                 camera_grab_stills_from_video = True,
+                 camera_video_encoder = ''):
         super().__init__()
         self.camera_username = camera_username
         self.camera_password = camera_password
@@ -160,9 +190,10 @@ class CameraConfig(object):
         self.camera_event_exec_delay_seconds = camera_event_exec_delay_seconds
         self.camera_save_folder = camera_save_folder
         self.camera_grab_stills_from_video = camera_grab_stills_from_video
+        self.camera_video_encoder = camera_video_encoder  # empty for no re-encoding
 
     def is_event_targeted(self, event_name: str) -> bool:
-        return self.camera_target_events == '*' or event_name in self.camera_target_events
+        return WILDCARD_EVENT in self.camera_target_events or event_name in self.camera_target_events
 
 # https://stackoverflow.com/a/75060902/609575
 def uri_add_authentication(url, username, password):
@@ -175,15 +206,51 @@ def uri_add_authentication(url, username, password):
 
 
 class TargetCamera:
+    __slots__ = ('config', 'onvif', 'detections', 'detection_expiry_queue', 'rtsp_uris', 'detection_watchers')
 
     def __init__(self, camera_config: CameraConfig):
         super().__init__()
         self.config = camera_config
         self.onvif = None
         self.detections: Dict[str, datetime] = {}
+        self.detection_expiry_queue: Deque[Tuple[float, str]] = deque()  # (time.monotonic() expiry, detection)
+        self.rtsp_uris: Dict[str, str] = {}
+        self.detection_watchers: List[asyncio.Event] = []
+
+    def watch_detections(self) -> asyncio.Event:
+        # Returns an event that will be set each time new detections are added.
+        watcher = asyncio.Event()
+        self.detection_watchers.append(watcher)
+        return watcher
+
+    def notify_detections(self):
+        for watcher in self.detection_watchers:
+            watcher.set()
+
+    async def get_rtsp_uri(self, stream_name) -> str | None:
+        # Shared by all the camera's handlers.  The URI is fixed for the camera's lifetime, so only query the camera once.
+        if rtsp_uri := self.rtsp_uris.get(stream_name):
+            return rtsp_uri
+        if self.onvif is None:  # NotificationPuller is between connection attempts
+            raise ONVIFError('camera is not connected')
+        media_service = await self.onvif.create_media_service()
+        for profile in await media_service.GetProfiles():
+            if profile.Name == stream_name:
+                stream_setup = media_service.create_type('GetStreamUri')
+                stream_setup.StreamSetup = {'Stream': 'RTP-Unicast', 'Transport': {'Protocol': 'RTSP'}}
+                stream_setup.ProfileToken = profile.token
+                uri_data = await media_service.GetStreamUri(stream_setup)
+                log.info(f'TargetCamera: {self.config.camera_id} matched {profile.Name=} RTSP {uri_data.Uri=}')
+                rtsp_uri = uri_add_authentication(uri_data.Uri, self.onvif.user, self.onvif.passwd)
+                self.rtsp_uris[stream_name] = rtsp_uri
+                return rtsp_uri
+            log.info(f'TargetCamera: {self.config.camera_id} skipped {profile.Name=}')
+        return None
 
 
 class NotificationPuller:
+    __slots__ = ('target_camera', 'camera_id', 'pullpoint_manager', 'pullpoint_service', 'stop_requested',
+                 'log_name', 'detection_expiry_seconds')
 
     def __init__(self, target_camera: TargetCamera):
         self.target_camera = target_camera
@@ -201,14 +268,15 @@ class NotificationPuller:
             try:
                 if attempt_count == 1:
                     log.info(F"{self.log_name} connecting.")
-                camera_config = self.target_camera.config
-                self.target_camera.onvif = ONVIFCamera(
-                    camera_config.camera_ip_addr,
-                    int(camera_config.camera_onvif_port),
-                    camera_config.camera_username,
-                    camera_config.camera_password,
-                    str(CAMERA_ONVIF_WSDL_DIR))
-                await self.target_camera.onvif.update_xaddrs()
+                if self.target_camera.onvif is None:  # Kept across reconnects, so capabilities are only fetched once
+                    camera_config = self.target_camera.config
+                    self.target_camera.onvif = ONVIFCamera(
+                        camera_config.camera_ip_addr,
+                        int(camera_config.camera_onvif_port),
+                        camera_config.camera_username,
+                        camera_config.camera_password,
+                        str(CAMERA_ONVIF_WSDL_DIR))
+                    await self.target_camera.onvif.update_xaddrs()
                 interval_time = (timedelta(seconds=self.detection_expiry_seconds))
                 self.pullpoint_manager = await self.target_camera.onvif.create_pullpoint_manager(
                     interval_time,
@@ -222,6 +290,11 @@ class NotificationPuller:
                 elif log.isEnabledFor(logging.DEBUG):
                     log.debug(f'{self.log_name} {attempt_count=} connect: http error, retrying'
                                 f' every {EXCEPTION_RETRY_WAIT_SECONDS} seconds. [{repr(httpx_exception)}]')
+                try:  # Start again from scratch, in case the camera has been reset or reconfigured
+                    await self.disconnect(close_camera=True)
+                except Exception as disconnect_exception:
+                    if log.isEnabledFor(logging.DEBUG):
+                        log.debug(f'{self.log_name} connect: ignoring disconnect exception. [{repr(disconnect_exception)}]')
                 attempt_count += 1
                 await asyncio.sleep(EXCEPTION_RETRY_WAIT_SECONDS)
 
@@ -240,24 +313,40 @@ class NotificationPuller:
                 pullpoint_req.Timeout = (timedelta(days=0, hours=0,
                                                    seconds=self.detection_expiry_seconds))
                 log.info(F"{self.log_name} listening, pulling messages ...")
+                pull_messages = self.pullpoint_service.PullMessages
+                detection_expiry_seconds = self.detection_expiry_seconds
+                detections = self.target_camera.detections
+                name_and_value = itemgetter('Name', 'Value')
+                target_events = frozenset(self.target_camera.config.camera_target_events)
+                all_events_targeted = WILDCARD_EVENT in target_events
+                expiry_queue = self.target_camera.detection_expiry_queue
                 while not self.stop_requested:
+                    pull_started_at = time.monotonic()
                     try:
                         # throws httpx.RemoteProtocolError if it times out
-                        camera_messages = await self.pullpoint_service.PullMessages(pullpoint_req)
+                        camera_messages = await pull_messages(pullpoint_req)
                         if camera_messages and camera_messages['NotificationMessage']:
+                            added = False
+                            now = datetime.now()  # One timestamp for the whole batch
+                            expires_at = time.monotonic() + detection_expiry_seconds
+                            debug_enabled = log.isEnabledFor(logging.DEBUG)
                             for notification_msg in camera_messages['NotificationMessage']:
-                                if log.isEnabledFor(logging.DEBUG):  # Avoid expensive debugging
+                                if debug_enabled:  # Avoid expensive debugging
                                     log.debug(f"{self.log_name} {notification_msg=}")
-                                data = notification_msg['Message']['_value_1']['Data']
-                                for simple_item in data['SimpleItem']:
-                                    type_of_detection, is_happening = simple_item['Name'], simple_item['Value'] == 'true'
-                                    if not is_happening:
+                                for simple_item in notification_msg['Message']['_value_1']['Data']['SimpleItem']:
+                                    type_of_detection, value = name_and_value(simple_item)
+                                    if value != 'true':
                                         type_of_detection += EVENT_NOT_HAPPENING_SUFFIX
-                                    if type_of_detection not in self.target_camera.detections:
-                                        self.target_camera.detections[type_of_detection] = datetime.now()
-                                        log.info(f'{self.log_name} received {type_of_detection} event, added it to {self.target_camera.detections=}')
-                        else:
-                            await asyncio.sleep(WAIT_NO_NOTIFICATIONS_SECONDS)
+                                    # Only keep targeted events, so the handlers need not look at the rest.
+                                    if type_of_detection not in detections and (all_events_targeted or type_of_detection in target_events):
+                                        detections[type_of_detection] = now
+                                        expiry_queue.append((expires_at, type_of_detection))
+                                        log.info(f'{self.log_name} received {type_of_detection} event, added it to {detections=}')
+                                        added = True
+                            if added:
+                                self.target_camera.notify_detections()
+                        # Don't keep the decoded reply alive while waiting on the next long-poll.
+                        camera_messages = notification_msg = simple_item = None
                     except (aiohttp.ServerDisconnectedError, httpx.RemoteProtocolError) as nothing_ready:
                         # These exceptions appear to occur if there is nothing available, but, curiously,
                         # they can occur more frequently than self.detection_expiry_seconds
@@ -265,20 +354,16 @@ class NotificationPuller:
                         # onvif-zeep-async 4.0.4 throws aiohttp.ServerDisconnectedError (every ~10 seconds).
                         if log.isEnabledFor(logging.DEBUG):
                             log.debug(f'{self.log_name} No messages ready [{repr(nothing_ready)}]')
-                        await asyncio.sleep(WAIT_NO_NOTIFICATIONS_EXCEPTION_SECONDS)  # Don't flood the camera with requests
-                    finally:
-                        now = datetime.now()
-                        for type_of_detection, first_seen_at in [
-                            (name, first_seen_at)
-                            for name, first_seen_at in self.target_camera.detections.items()
-                            if (now - first_seen_at).seconds > self.detection_expiry_seconds]:
-                                del self.target_camera.detections[type_of_detection]
-                                log.info(f"{self.log_name} expire '{type_of_detection}': {first_seen_at} -> {self.target_camera.detections=}")
+                        # PullMessages is a long-poll, so go straight back to listening, unless the camera
+                        # dropped the request almost immediately, in which case don't flood it with requests.
+                        remaining_wait = WAIT_NO_NOTIFICATIONS_EXCEPTION_SECONDS - (time.monotonic() - pull_started_at)
+                        if remaining_wait > 0:
+                            await asyncio.sleep(remaining_wait)
             except Exception as listen_exception:
                 log.warning(f'{self.log_name} listen: unexpected exception. {listen_exception.__class__.__module__}: [{repr(listen_exception)}]')
             finally:
                 try:
-                    await self.disconnect()
+                    await self.disconnect(close_camera=self.stop_requested)
                 except Exception as disconnect_exception:
                     log.warning(f'{self.log_name} listen: ignoring disconnect exception. {disconnect_exception.__class__.__module__}: [{repr(disconnect_exception)}]')
                 self.pullpoint_service = None
@@ -286,7 +371,25 @@ class NotificationPuller:
                     log.warning(f'{self.log_name} listen: attempting reconnect in {EXCEPTION_RETRY_WAIT_SECONDS} seconds')
                     await asyncio.sleep(EXCEPTION_RETRY_WAIT_SECONDS)
 
-    async def disconnect(self):
+    async def expire(self):
+        # Runs independently of listen() because a long-poll may not return for detection_expiry_seconds.
+        while not self.stop_requested:
+            self.expire_detections()
+            await asyncio.sleep(DETECTION_EXPIRY_CHECK_SECONDS)
+
+    def expire_detections(self):
+        # Detections are only ever appended and their first-seen time is never updated, so the
+        # queue is in expiry order: pop from the front until reaching one that is still current.
+        # Monotonic time is used so that wall clock adjustments can't stall or hasten expiry.
+        detections = self.target_camera.detections
+        expiry_queue = self.target_camera.detection_expiry_queue
+        now = time.monotonic()
+        while expiry_queue and expiry_queue[0][0] <= now:
+            _, type_of_detection = expiry_queue.popleft()
+            first_seen_at = detections.pop(type_of_detection, None)
+            log.info(f"{self.log_name} expire '{type_of_detection}': {first_seen_at} -> {detections=}")
+
+    async def disconnect(self, close_camera: bool = False):
         errors = []
         try:
             if self.pullpoint_service:
@@ -294,12 +397,18 @@ class NotificationPuller:
                     await self.pullpoint_service.close()
                 except Exception as sce:
                     errors.append(f"pullpoint_service.close: {sce}")
+                if self.target_camera.onvif and not close_camera:
+                    # The camera caches its services, and would otherwise hand the closed one back on reconnect.
+                    camera_services = self.target_camera.onvif.services
+                    for binding_key, service in list(camera_services.items()):
+                        if service is self.pullpoint_service:
+                            del camera_services[binding_key]
             if self.pullpoint_manager:
                 try:
                     await self.pullpoint_manager.shutdown()
                 except Exception as mse:
                     errors.append(f"pullpoint_manager.shutdown: {mse}")
-            if self.target_camera.onvif:
+            if close_camera and self.target_camera.onvif:
                 try:
                     await self.target_camera.onvif.close()
                 except Exception as oce:
@@ -307,34 +416,64 @@ class NotificationPuller:
         finally:
             self.pullpoint_service = None
             self.pullpoint_manager = None
-            self.target_camera.onvif = None
+            if close_camera:
+                self.target_camera.onvif = None
         if errors:
             raise Exception("Disconnection errors: " + "; ".join(errors))
 
 
-def save_video(camera_config: CameraConfig, rtsp_uri: str, clip_seconds: int, detections: Dict[str, datetime]):
+# Runs ffmpeg as a child of the event loop rather than blocking a worker on it.
+# Raises ffmpeg.Error on failure, as ffmpeg-python's run() does, and returns ffmpeg's stderr.
+# If the wait times out or is cancelled, ffmpeg is asked to stop, so it can close its output cleanly.
+async def run_ffmpeg(stream_spec, timeout_seconds: float | None = None) -> bytes:
+    process = await asyncio.create_subprocess_exec(
+        *stream_spec.compile(overwrite_output=True),
+        stdin=asyncio.subprocess.DEVNULL, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE)
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug(f"run_ffmpeg: started {process.pid=} {timeout_seconds=}")
+    try:
+        _, err = await asyncio.wait_for(process.communicate(), timeout_seconds)
+    except BaseException:  # Timeout or cancellation
+        if process.returncode is None:
+            process.terminate()
+            await process.wait()
+        raise
+    if process.returncode != 0:
+        raise ffmpeg.Error('ffmpeg', None, err)
+    return err
+
+
+async def save_video(camera_config: CameraConfig, rtsp_uri: str, clip_seconds: int, detections: Dict[str, datetime]):
     # Will only start new video if first relevant_detection is not yet being recorded,
     # that effectively stops any new additional recordings until the first relevant_detection expires.
-    incident_time = list(detections.values())[0]
     save_path = generate_save_path(camera_config.camera_id, datetime.now(), VIDEO_DIR, 'mp4')
     log.info(f"writing {save_path.as_posix()}")
-    save_path.parent.parent.mkdir(exist_ok=True)
-    save_path.parent.mkdir(exist_ok=True)
     if save_path.exists():
         log.error(f'Skipping save. Save file already exists: {save_path}')
         return
     try:  # using mpegts so it can be previewed as it's being created.
-        process = ffmpeg.input(rtsp_uri, t=clip_seconds, loglevel=24,  rtsp_transport='tcp').output(
-            filename=save_path.as_posix(), f='mpegts',
-            vcodec='h264', acodec='aac', preset='ultrafast', tune='zerolatency',
-            loglevel=8).run_async(pipe_stdout=False, pipe_stderr=True, overwrite_output=True)
         timeout_seconds = clip_seconds + 30
-        log.info(f"Waiting on  {process.pid=} {timeout_seconds=}")
-        out, err = process.communicate(timeout=timeout_seconds)
-        log_ffmpeg_output(out, err)
+        # The camera's video is already H.264, so copy it unless an encoder is configured.  The audio is
+        # always encoded, cameras typically send G.711 (pcm_alaw), which mpegts cannot carry.
+        input_args, video_args = {}, {'vcodec': 'copy'}
+        if encoder := camera_config.camera_video_encoder:
+            video_args = {'vcodec': encoder}
+            if hwaccel := VIDEO_ENCODER_HWACCEL.get(encoder):
+                input_args = {'hwaccel': hwaccel}
+                if hwaccel != 'videotoolbox':
+                    input_args['hwaccel_output_format'] = hwaccel
+            elif encoder == 'libx264':
+                video_args.update(preset='ultrafast', tune='zerolatency')
+        err = await run_ffmpeg(
+            ffmpeg.input(rtsp_uri, t=clip_seconds, loglevel=24, **RTSP_INPUT_ARGS, **input_args).output(
+                filename=save_path.as_posix(), f='mpegts',
+                acodec='aac', **video_args,
+                loglevel=8),
+            timeout_seconds=timeout_seconds)
+        log_ffmpeg_output(None, err)
         log.info(f"closed {save_path.as_posix()}")
-    except subprocess.TimeoutExpired as ffmpeg_error_exception:
-        log.error(f"May not have saved {save_path.as_posix()} due to ffmpeg timeout error {ffmpeg_error_exception}")
+    except asyncio.TimeoutError:
+        log.error(f"May not have saved {save_path.as_posix()} due to ffmpeg timeout after {timeout_seconds} seconds")
         return
     except ffmpeg.Error as ffmpeg_error_exception:
         log.error(f"May not have saved {save_path.as_posix()} due to ffmpeg error {ffmpeg_error_exception}")
@@ -347,29 +486,40 @@ def save_video(camera_config: CameraConfig, rtsp_uri: str, clip_seconds: int, de
                                      {VIDEO_ENDED_SYNTHETIC_EVENT: datetime.now(), })
 
 
-def extract_frame_to_image(camera_config: CameraConfig, incident_time: datetime, image_save_path: Path):
-    # Extract from the file we have already written
-    time.sleep(WAIT_FOR_LOCAL_VIDEO_SECONDS)  # Initial wait
-    video_path, offset_seconds = find_nearest_video(camera_config.camera_id, incident_time, camera_config.camera_clip_seconds)
-    if video_path:
-        try:
-            log.info(f"extract_frame_to_image: writing {image_save_path.as_posix()} from {video_path.as_posix()} {offset_seconds=}")
-            out, err = ffmpeg.input(video_path.as_posix(), loglevel=8).output(
-                image_save_path.as_posix(), vframes=1, ss=offset_seconds, qscale=2).run(
-                capture_stdout=False, capture_stderr=True, overwrite_output=True, quiet=True)
-            log_ffmpeg_output(out, err)
-            if not image_save_path.exists():
-                log.error(f"ffmpeg failed to write {image_save_path.as_posix()}")
-        except ffmpeg.Error as ffmpeg_error_exception:
-            log.error(f"ffmpeg error {ffmpeg_error_exception}")
-            log_ffmpeg_output(ffmpeg_error_exception.stdout, ffmpeg_error_exception.stderr, as_error=True)
-        if log.isEnabledFor(logging.DEBUG):
-            log.debug(f'extract_frame_to_image: closed {image_save_path.as_posix()}')
-    else:
+async def extract_frame_to_image(camera_config: CameraConfig, incident_time: datetime, image_save_path: Path):
+    # Extract from the file we have already written, retrying until the video has been written up to the frame.
+    deadline = time.monotonic() + WAIT_FOR_LOCAL_VIDEO_SECONDS
+    video_path, offset_seconds = None, 0
+    ffmpeg_error_exception = None
+    while True:
+        if video_path is None:
+            video_path, offset_seconds = find_nearest_video(camera_config.camera_id, incident_time, camera_config.camera_clip_seconds)
+        if video_path:
+            try:
+                if log.isEnabledFor(logging.DEBUG):
+                    log.debug(f"extract_frame_to_image: trying {image_save_path.as_posix()} from {video_path.as_posix()} {offset_seconds=}")
+                err = await run_ffmpeg(ffmpeg.input(video_path.as_posix(), loglevel=8).output(
+                    image_save_path.as_posix(), vframes=1, ss=offset_seconds, qscale=2))
+                ffmpeg_error_exception = None
+                if image_save_path.exists():
+                    log.info(f"extract_frame_to_image: wrote {image_save_path.as_posix()} from {video_path.as_posix()} {offset_seconds=}")
+                    log_ffmpeg_output(None, err)
+                    return
+            except ffmpeg.Error as ffmpeg_exception:  # Most likely the frame hasn't been written yet
+                ffmpeg_error_exception = ffmpeg_exception
+        if time.monotonic() >= deadline:
+            break
+        await asyncio.sleep(LOCAL_VIDEO_POLL_SECONDS)
+    if video_path is None:
         log.error(f'extract_frame_to_image: failed to find video for {incident_time=}, could not extract frame')
+    elif ffmpeg_error_exception is not None:
+        log.error(f"ffmpeg error {ffmpeg_error_exception}")
+        log_ffmpeg_output(ffmpeg_error_exception.stdout, ffmpeg_error_exception.stderr, as_error=True)
+    else:
+        log.error(f"ffmpeg failed to write {image_save_path.as_posix()}")
 
 
-def save_image(camera_config: CameraConfig, rtsp_uri: str, detections: Dict[str, datetime], grab_stills_from_video: bool):
+async def save_image(camera_config: CameraConfig, rtsp_uri: str, detections: Dict[str, datetime], grab_stills_from_video: bool):
     if grab_stills_from_video:  # Grab a frame for each incident time
         for detection, incident_time in detections.items():
             camera_id = camera_config.camera_id
@@ -379,23 +529,23 @@ def save_image(camera_config: CameraConfig, rtsp_uri: str, detections: Dict[str,
             else:
                 try:
                     log.info(f"save_image: extract frame {save_path.as_posix()} {grab_stills_from_video=}")
-                    extract_frame_to_image(camera_config, incident_time, save_path)
+                    await extract_frame_to_image(camera_config, incident_time, save_path)
                 except ffmpeg.Error as ffmpeg_error_exception:
                     log.error(f"save_image: extract ffmpeg error {ffmpeg_error_exception}")
                     log_ffmpeg_output(ffmpeg_error_exception.stdout, ffmpeg_error_exception.stderr, as_error=True)
     else:  # Grab one frame from start of incident
-        time.sleep(0.5)
+        await asyncio.sleep(0.5)
         camera_id = camera_config.camera_id
-        save_path = generate_save_path(camera_id, detections.values()[0], IMAGE_DIR, 'jpg')
+        save_path = generate_save_path(camera_id, next(iter(detections.values())), IMAGE_DIR, 'jpg')
         if save_path.exists():
             log.info(f'save_image: Skipping save. Save file already exists: {save_path}')
             return
         try:
             log.info(f"save_image: rtsp grab frame {save_path.as_posix()} {grab_stills_from_video=}")
-            out, err = ffmpeg.input(rtsp_uri, loglevel=8, rtsp_transport='tcp').output(
+            err = await run_ffmpeg(ffmpeg.input(rtsp_uri, loglevel=8, **RTSP_INPUT_ARGS).output(
                 filename=save_path.as_posix(), vframes=1,
-                loglevel=8).run(capture_stdout=False, capture_stderr=True, overwrite_output=True, quiet=True)
-            log_ffmpeg_output(out, err)
+                loglevel=8))
+            log_ffmpeg_output(None, err)
         except ffmpeg.Error as ffmpeg_error_exception:
             log.error(f"save_image: ffmpeg error {ffmpeg_error_exception}")
             log_ffmpeg_output(ffmpeg_error_exception.stdout, ffmpeg_error_exception.stderr, as_error=True)
@@ -410,12 +560,9 @@ def log_ffmpeg_output(stdout, stderr, as_error: bool=False):
     pass
 
 
+# The camera's folders are created up front by MediaSaverEventHandler.
 def generate_save_path(camera_id: str, incident_time: datetime, save_folder: Path, file_type_suffix: str) -> Path:
-    save_folder.mkdir(parents=True, exist_ok=True)
-    save_path = save_folder / f'{camera_id}' / f'{incident_time.strftime("%Y%m%d-%H%M%S")}.{file_type_suffix}'
-    save_path.parent.parent.mkdir(exist_ok=True)
-    save_path.parent.mkdir(exist_ok=True)
-    return save_path
+    return save_folder / f'{camera_id}' / f'{incident_time.strftime("%Y%m%d-%H%M%S")}.{file_type_suffix}'
 
 
 def find_nearest_video(camera_id: str, incident_time: datetime, clip_seconds: int) -> Path:
@@ -437,29 +584,15 @@ def execute_external_handler(handler_exe: Path, camera_id, relevant_detections:
 
 
 class EventHandler(ABC):
+    __slots__ = ('stop_requested', 'target_camera', 'detections_changed', 'handled')
 
     def __init__(self, target_camera: TargetCamera):
         super().__init__()
         self.stop_requested = False
         self.target_camera = target_camera
+        self.detections_changed = target_camera.watch_detections()
         self.handled: Dict[str, datetime] = {}
 
-    async def _find_rtsp_uri(self, media_service, stream_name) -> str | None:
-        rtsp_uri = None
-        for profile in await media_service.GetProfiles():
-            stream_setup = media_service.create_type('GetStreamUri')
-            stream_setup.StreamSetup = {'Stream': 'RTP-Unicast', 'Transport': {'Protocol': 'RTSP'}}
-            stream_setup.ProfileToken = profile.token
-            uri_data = await media_service.GetStreamUri(stream_setup)
-            if profile.Name == stream_name:
-                log.info(f'EventHandler: {self.target_camera.config.camera_id} matched {profile.Name=} RTSP {uri_data.Uri=}')
-                rtsp_uri = uri_add_authentication(uri_data.Uri,
-                                                  self.target_camera.onvif.user,
-                                                  self.target_camera.onvif.passwd)
-            else:
-                log.info(f'EventHandler: {self.target_camera.config.camera_id} skipped {profile.Name=} RTSP {uri_data.Uri=}')
-        return rtsp_uri
-
     def all_been_handled(self, detections: Dict[str, datetime]):  # have all been handled already
         return all(item in self.handled.items() for item in detections.items())
 
@@ -480,6 +613,7 @@ class EventHandler(ABC):
 
 # Loops checking for events and writes out media for any specified as notable
 class MediaSaverEventHandler(EventHandler):
+    __slots__ = ('camera_id', 'stream_name', 'log_name', 'save_path')
 
     def __init__(self, target_camera: TargetCamera, stream_name):
         super().__init__(target_camera)
@@ -491,41 +625,45 @@ class MediaSaverEventHandler(EventHandler):
             self.save_path.mkdir(exist_ok=True)
             if not os.access(self.save_path, os.W_OK):
                 raise PermissionError(f"path {self.save_path} is not writable")
+            for media_dir in (VIDEO_DIR, IMAGE_DIR):  # Create once, rather than on every save
+                (media_dir / self.camera_id).mkdir(parents=True, exist_ok=True)
         except (PermissionError, FileNotFoundError) as file_access_exception:
             log.error(f"{self.log_name}: {str(file_access_exception)}")
             sys.exit(1)
         log.info(f"{self.log_name}: save path: {self.save_path.as_posix()}")
 
     @abstractmethod
-    def get_saver_function(self, rtsp_uri: str, relevant_detections: Dict[str, datetime]) -> Callable:
+    def get_saver_function(self, rtsp_uri: str, relevant_detections: Dict[str, datetime]) -> Callable[[], Awaitable[None]]:
         assert 'Abstract lacks definition'
-        return lambda *args, **kwargs: None
+        return partial(asyncio.sleep, 0)
+
+    def relevant_detections(self) -> Dict[str, datetime]:
+        # Only save media on non-False events, the detections only include targeted events.
+        return {event_name: etime for event_name, etime in self.target_camera.detections.items()
+                if not event_name.endswith(EVENT_NOT_HAPPENING_SUFFIX)}
+
+    def covered_by_save(self, saved_detections: Dict[str, datetime], save_started_at: datetime) -> Dict[str, datetime]:
+        # The detections that a completed save has taken care of.
+        return saved_detections
 
     async def handle_events(self):
         previous_rerr = None
         while not self.stop_requested:
             try:
-                media_service = await self.target_camera.onvif.create_media_service()
                 log.info(f'{self.log_name}: Trying to connect to stream {self.stream_name}')
-                if rtsp_uri := await self._find_rtsp_uri(media_service, self.stream_name):
+                if rtsp_uri := await self.target_camera.get_rtsp_uri(self.stream_name):
                     if log.isEnabledFor(logging.DEBUG):   # Note the URI now contains the password!
                         log.debug(f'{self.log_name}: Full URI for {self.stream_name}: {rtsp_uri=}')
                     log.info(f'{self.log_name}: Successfully connected to {self.stream_name}')
                     while not self.stop_requested:  # Loop handling additions to detections made by NotificationPuller
-                        # Only save media on relevant non-False events.
-                        if relevant_detections := {
-                            event_name: etime for event_name, etime in self.target_camera.detections.items()
-                            if not event_name.endswith(EVENT_NOT_HAPPENING_SUFFIX)
-                               and self.target_camera.config.is_event_targeted(event_name)
-                        }:
-                            loop = asyncio.get_running_loop()
+                        self.detections_changed.clear()  # Clear before looking, so no addition is missed
+                        if relevant_detections := self.relevant_detections():
                             if to_do := self.not_yet_handled(relevant_detections):
-                                with ProcessPoolExecutor() as pool:
-                                    await loop.run_in_executor(
-                                        pool,
-                                        self.get_saver_function(rtsp_uri, to_do))
+                                save_started_at = datetime.now()
+                                await self.get_saver_function(rtsp_uri, to_do)()
+                                relevant_detections = self.covered_by_save(relevant_detections, save_started_at)
                             self.mark_as_handled(relevant_detections)  # update
-                        await asyncio.sleep(0.1)
+                        await self.detections_changed.wait()
                     previous_rerr = None
                 else:
                     log.info(f"{self.log_name}: Could not connect to stream {self.stream_name}. "
@@ -537,27 +675,37 @@ class MediaSaverEventHandler(EventHandler):
                 if rerr != previous_rerr:
                     log.warning(f"{self.log_name}: ONVIF Error (may not be serious): [{repr(onvif_exception)}]")
                     log.info(f'{self.log_name}: Assuming {self.log_name} camera is unavailable, will keep retrying every {EXCEPTION_RETRY_WAIT_SECONDS} seconds.')
+                    previous_rerr = rerr
                 await asyncio.sleep(EXCEPTION_RETRY_WAIT_SECONDS)
 
 
 class VideoWriter(MediaSaverEventHandler):
+    __slots__ = ('clip_seconds',)
 
     def __init__(self, target_camera: TargetCamera, stream_name: str, clip_seconds: int):
         super().__init__(target_camera, stream_name)
         self.clip_seconds = clip_seconds
 
-    def get_saver_function(self, rtsp_uri: str, relevant_detections: Dict[str, datetime]) -> Callable:
+    def get_saver_function(self, rtsp_uri: str, relevant_detections: Dict[str, datetime]) -> Callable[[], Awaitable[None]]:
         return partial(save_video, self.target_camera.config, rtsp_uri, self.clip_seconds, relevant_detections)
 
+    def covered_by_save(self, saved_detections: Dict[str, datetime], save_started_at: datetime) -> Dict[str, datetime]:
+        # Detections first seen while the clip was being recorded are already in it, so don't start
+        # another overlapping clip for them (for example, IsCar arriving during an IsPeople clip).
+        return saved_detections | {event_name: etime for event_name, etime in self.relevant_detections().items()
+                                   if etime >= save_started_at}
+
 class ImageWriter(MediaSaverEventHandler):
+    __slots__ = ()
 
-    def get_saver_function(self, rtsp_uri: str, relevant_detections: Dict[str, datetime]) -> Callable:
+    def get_saver_function(self, rtsp_uri: str, relevant_detections: Dict[str, datetime]) -> Callable[[], Awaitable[None]]:
         # Will capture a new frame for as yet unhandled
         return partial(save_image, self.target_camera.config, rtsp_uri, relevant_detections,
                        self.target_camera.config.camera_grab_stills_from_video)
 
 # Loops checking for events and then executes an external program
 class EventExecHandler(EventHandler):
+    __slots__ = ('handler_exe', 'delay_seconds')
 
     def __init__(self, target_camera: TargetCamera, handler_exe: Path):
         super().__init__(target_camera)
@@ -569,9 +717,8 @@ class EventExecHandler(EventHandler):
     async def handle_events(self):
         current_delay = self.delay_seconds
         while not self.stop_requested:
-            if relevant_detections := {event: etime
-                                       for event, etime in self.target_camera.detections.items()
-                                       if self.target_camera.config.is_event_targeted(event)}:
+            self.detections_changed.clear()  # Clear before looking, so no addition is missed
+            if relevant_detections := dict(self.target_camera.detections):  # All are targeted events
                 if not self.all_been_handled(relevant_detections):
                     if current_delay > 0:  # sleep and see if more events pile in
                         for _ in range(current_delay):
@@ -579,17 +726,37 @@ class EventExecHandler(EventHandler):
                                 break
                             await asyncio.sleep(1.0)
                         current_delay = 0  # don't delay any longer
+                        continue  # look again straight away, including anything that piled in
                     else:
-                        loop = asyncio.get_running_loop()
-                        with ProcessPoolExecutor() as pool:
-                            await loop.run_in_executor(
-                                pool,
-                                partial(execute_external_handler, self.handler_exe,
-                                        self.target_camera.config.camera_id,
-                                        relevant_detections))
+                        execute_external_handler(self.handler_exe,  # Doesn't wait for the handler to finish
+                                                 self.target_camera.config.camera_id,
+                                                 relevant_detections)
                         self.mark_as_handled(relevant_detections)
                         current_delay = self.delay_seconds
-            await asyncio.sleep(0.1)
+            await self.detections_changed.wait()
+
+
+# Keeps rerunning a watcher's coroutine if it fails unexpectedly, so one camera's failure
+# is contained, rather than propagating and cancelling the whole task group.
+async def supervise(watcher: NotificationPuller | EventHandler, run: Callable[[], Awaitable[None]]):
+    while not watcher.stop_requested:
+        try:
+            await run()
+        except Exception as run_exception:
+            log.exception(f'{watcher.__class__.__name__}: {watcher.target_camera.config.camera_id} {run.__name__}: '
+                          f'unexpected exception, restarting in {EXCEPTION_RETRY_WAIT_SECONDS} seconds. '
+                          f'[{repr(run_exception)}]')
+            await asyncio.sleep(EXCEPTION_RETRY_WAIT_SECONDS)
+
+
+async def trim_memory():
+    # Each PullMessages reply is decoded into a fresh tree of zeep objects, over weeks the freed
+    # memory fragments the heap, so periodically collect and return what's free to the OS.
+    while True:
+        await asyncio.sleep(MEMORY_TRIM_INTERVAL_SECONDS)
+        gc.collect()
+        if malloc_trim is not None:
+            malloc_trim(0)
 
 
 async def discover_devices():
@@ -613,15 +780,6 @@ async def discover_devices():
 
 async def main():
 
-    def exit_handler(signum, _):
-        log.warning(f'{signal.strsignal(signum)} signalled - exiting')
-        notification_puller.stop_requested = True
-        video_writer.stop_requested = True
-        sys.exit(0)
-
-    signal.signal(signal.SIGHUP, exit_handler)
-    signal.signal(signal.SIGINT, exit_handler)
-
     arg_parser = argparse.ArgumentParser(
         prog='onvifeye',
         description='Monitor a TP-Link Tapo-camera for ONVIF events and record them using RSTP',
@@ -635,7 +793,6 @@ async def main():
         arg_parser.add_argument(f'--{key.replace("_", "-")}', type=type(value), required=False)
 
     args_namespace = arg_parser.parse_args()
-    print(args_namespace)
 
     if args_namespace.verbose:
         log.setLevel(logging.DEBUG)
@@ -661,25 +818,27 @@ async def main():
             json.dump(camera_config, fp, default=vars, indent=4)
         sys.exit(0)
 
-    for config_file in [camera_conf_dir / match for match in glob.glob('*.conf', root_dir=camera_conf_dir)]:
-        if config_file.is_file():
-            log.info(f'Reading config from {config_file.as_posix()}.')
-            with open(config_file) as fp:
-                camera_config = CameraConfig(**json.load(fp, strict=False))
-            for arg, value in vars(args_namespace).items():  # override from command line args - if any
-                if value:
-                    print(f'{arg=}{value=}')
-                    log.warning(f'Overriding {config_file.as_posix()} {arg} with command line value {value}.')
-                    vars(camera_config)[arg] = value
+    with os.scandir(camera_conf_dir) as conf_dir_entries:  # DirEntry.is_file() avoids an extra stat per file
+        config_files = sorted(Path(entry.path) for entry in conf_dir_entries
+                              if entry.name.endswith('.conf') and not entry.name.startswith('.') and entry.is_file())
+    for config_file in config_files:
+        log.info(f'Reading config from {config_file.as_posix()}.')
+        with open(config_file) as fp:
+            camera_config = CameraConfig(**json.load(fp, strict=False))
+        for arg, value in vars(args_namespace).items():  # override from command line args - if any
+            if value:
+                log.warning(f'Overriding {config_file.as_posix()} {arg} with command line value {value}.')
+                vars(camera_config)[arg] = value
 
+        if log.isEnabledFor(logging.DEBUG):
             log.debug(f'{vars(camera_config)}')
-            camera_configs_list.append(camera_config)
+        camera_configs_list.append(camera_config)
 
     if not camera_configs_list:
         command_line_config = CameraConfig()
         for arg, value in vars(args_namespace).items():  # override from command line args - if any
             if value:
-                vars(camera_config)[arg] = value
+                vars(command_line_config)[arg] = value
         camera_configs_list.append(command_line_config)
 
     target_camera_list = []
@@ -687,11 +846,32 @@ async def main():
         target_camera = TargetCamera(camera_config)
         target_camera_list.append(target_camera)
 
+    loop = asyncio.get_running_loop()
+    loop.set_exception_handler(handle_task_exception)
+
+    watchers = []  # Everything with a stop_requested flag
+    watch_tasks = []
+
+    def exit_handler(signum):
+        # Called from the event loop, so the tasks can be cancelled cleanly, unsubscribing from the cameras.
+        log.warning(f'{signal.strsignal(signum)} signalled - exiting')
+        for watcher in watchers:
+            watcher.stop_requested = True
+        for watch_task in watch_tasks:
+            watch_task.cancel()
+
+    for signum in (signal.SIGHUP, signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, exit_handler, signum)
+
     try:
         async with asyncio.TaskGroup() as watch_task_group:
+            watch_tasks.append(watch_task_group.create_task(trim_memory()))
             for target_camera in target_camera_list:
+                camera_config = target_camera.config
                 notification_puller = NotificationPuller(target_camera)
-                _ = watch_task_group.create_task(notification_puller.listen())
+                watchers.append(notification_puller)
+                watch_tasks.append(watch_task_group.create_task(supervise(notification_puller, notification_puller.listen)))
+                watch_tasks.append(watch_task_group.create_task(supervise(notification_puller, notification_puller.expire)))
                 if camera_config.camera_stills_stream_name:
                     if camera_config.camera_grab_stills_from_video:
                         log.warning(f'ImageWriter: {camera_config.camera_id} set to camera_grab_stills_from_video, ignoring stream {camera_config.camera_stills_stream_name}')
@@ -700,16 +880,19 @@ async def main():
                         image_feed = camera_config.camera_stills_stream_name
                     log.info(f'ImageWriter: {camera_config.camera_id} still-image feed set to {image_feed}')
                     image_writer = ImageWriter(target_camera, stream_name=image_feed)
-                    _ = watch_task_group.create_task(image_writer.handle_events())
+                    watchers.append(image_writer)
+                    watch_tasks.append(watch_task_group.create_task(supervise(image_writer, image_writer.handle_events)))
                 if camera_config.camera_stream_name:
-                    log.info(f'ImageWriter: {camera_config.camera_id} video feed set to {image_feed}')
+                    log.info(f'VideoWriter: {camera_config.camera_id} video feed set to {camera_config.camera_stream_name}')
                     video_writer = VideoWriter(target_camera,
                                                stream_name=camera_config.camera_stream_name,
                                                clip_seconds=camera_config.camera_clip_seconds)
-                    _ = watch_task_group.create_task(video_writer.handle_events())
+                    watchers.append(video_writer)
+                    watch_tasks.append(watch_task_group.create_task(supervise(video_writer, video_writer.handle_events)))
                 if camera_config.camera_event_exec:
                     event_exec_runner = EventExecHandler(target_camera, Path(camera_config.camera_event_exec))
-                    _ = watch_task_group.create_task(event_exec_runner.handle_events())
+                    watchers.append(event_exec_runner)
+                    watch_tasks.append(watch_task_group.create_task(supervise(event_exec_runner, event_exec_runner.handle_events)))
     except* Exception as task_group_exception:
         log.exception(f"Caught taskgroup exception: {task_group_exception.__class__.__name__}: {task_group_exception}")
         # TODO - maybe need to restart?
@@ -719,12 +902,6 @@ async def main():
         #     os.execv(sys.executable, [sys.executable] + sys.argv)
 
 
-    loop = asyncio.get_event_loop()
-    loop.set_exception_handler(handle_task_exception)
-
-    await watch_task_group
-
-
 def handle_task_exception(_, context):
     # context["message"] will always be there; but context["exception"] may not
     msg = context.get("message", "No message")
@@ -743,7 +920,10 @@ if __name__ == '__main__':
         tty_fd = None
         tty_attrs = []
     try:
-        asyncio.run(main())
+        if uvloop is not None:
+            uvloop.run(main())
+        else:
+            asyncio.run(main())
     except Exception as asyncio_run_exception:
         trace_text = traceback.format_exc()
         log.error(f'Exiting due to exception {asyncio_run_exception} {trace_text}')